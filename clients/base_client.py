@@ -1,5 +1,17 @@
-
+import asyncio
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import httpx
+
+from config import HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY
+
+# Connection pool settings shared by every client: keep connections to the LLM endpoint
+# open between requests so each one doesn't pay a new TCP + TLS handshake.
+HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
 
 class Client(ABC):
     """Abstract base class for LLM clients."""
@@ -11,3 +23,19 @@ class Client(ABC):
     def generate_text(self, prompt: str, **kwargs) -> str:
         """Generates text using the LLM."""
         pass
+
+    async def async_generate_text(self, system_prompt: str, prompt: str, **kwargs) -> str:
+        """Generates text without blocking the event loop.
+
+        Clients with a native async API should override this; the default runs
+        the blocking `generate_text` in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_text, f"{system_prompt}\n{prompt}", **kwargs)
+
+    async def async_stream_text(self, system_prompt: str, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yields the generated text in pieces as the LLM produces it.
+
+        Clients with a streaming API should override this; the default yields the
+        whole response from `async_generate_text` at once.
+        """
+        yield await self.async_generate_text(system_prompt, prompt, **kwargs)
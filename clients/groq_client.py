@@ -1,15 +1,40 @@
-from groq import Groq
-from clients.base_client import Client
+import httpx
+from groq import Groq, AsyncGroq
+from clients.base_client import Client, HTTP_LIMITS
 
 
 class GroqClient(Client):
     def __init__(self, api_key):
         super().__init__(api_key)
-        self.client = Groq(api_key=api_key)
+        self.client = Groq(api_key=api_key, http_client=httpx.Client(limits=HTTP_LIMITS))
+        self.async_client = AsyncGroq(api_key=api_key, http_client=httpx.AsyncClient(limits=HTTP_LIMITS))
+        self.model = "llama3-70b-8192"  # Default model
 
     def generate_text(self, prompt, **kwargs):
         chat_completion = self.client.chat.completions.create(
             messages=[{"role": "system", "content": prompt}],
             **kwargs
         )
-        return chat_completion.choices[0].message.content
\ No newline at end of file
+        return chat_completion.choices[0].message.content
+
+    async def async_generate_text(self, system_prompt, prompt, **kwargs):
+        kwargs.setdefault("model", self.model)
+        chat_completion = await self.async_client.chat.completions.create(
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            **kwargs
+        )
+        return chat_completion.choices[0].message.content.strip()
+
+    async def async_stream_text(self, system_prompt, prompt, **kwargs):
+        kwargs.setdefault("model", self.model)
+        stream = await self.async_client.chat.completions.create(
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            stream=True,
+            **kwargs
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()  # Ends the HTTP response if the caller stops early
@@ -1,10 +1,11 @@
 import asyncio
+import contextlib
 import json
 from datetime import datetime
 
 import ollama
 
-from clients.base_client import Client
+from clients.base_client import Client, HTTP_LIMITS
 
 from ollama import Client as OllClient
 from config import load_configuration, COMMIT_MESSAGES_LOG_FILE, GENERATED_MESSAGES_LOG_FILE
@@ -20,10 +21,12 @@ class OllamaClient(Client):
         self.client = OllClient(
             host=self.host,
             timeout=self.timeout,  # Set a timeout (in seconds)
+            limits=HTTP_LIMITS,  # Passed through to httpx: reuse connections across requests
         )
         self.async_client = ollama.AsyncClient(  # Use AsyncClient
             host=self.host,
             timeout=self.timeout,
+            limits=HTTP_LIMITS,
         )
         self.model = 'llama3'
 
@@ -52,6 +55,29 @@ class OllamaClient(Client):
             logger.error(f"Unexpected error during LLM Ollama API call: {e}")
             raise
 
+    async def async_stream_text(self, system_prompt, prompt, **kwargs):
+        logger.info(f"Streaming request to Ollama API (model: {self.model})...")
+        stream = await self.async_client.generate(
+            model=self.model,
+            prompt=prompt,
+            system=system_prompt,
+            format='json',
+            stream=True,
+            **kwargs
+        )
+        text_content = ""
+        complete = False
+        try:
+            # Closing the stream early (e.g. once the caller has what it needs) ends the HTTP response
+            async with contextlib.aclosing(stream):
+                async for part in stream:
+                    text_content += part['response']
+                    yield part['response']
+            complete = True
+        finally:
+            # Runs when the stream finishes or the caller closes it early
+            await save_llama_messages_to_log(system_prompt, prompt, text_content.strip(), complete)
+
     def generate_text(self, prompt, **kwargs):
         try:
             # Log the request parameters (prompt and other kwargs)
@@ -86,11 +112,16 @@ class OllamaClient(Client):
             logger.error(f"Unexpected error during LLM Ollama API call: {e}")
             raise
 
-async def save_llama_messages_to_log(system_prompt, prompt, text_content):
+async def save_llama_messages_to_log(system_prompt, prompt, text_content, complete=True):
     """Saves sysem prompt, prompt and generated text to a log file."""
     try:
         with open(GENERATED_MESSAGES_LOG_FILE, "a") as log_file:
-            if text_content:
+            if text_content and not complete:
+                # A stream closed early holds only part of the JSON, so it isn't validated
+                log_file.write(f"{20 * '-'} Time: {datetime.now()} {20 * '-'} \n")
+                log_file.write(f"Prompt: {prompt[:100]}\n")
+                log_file.write(f"Generated Text (stream closed early): {text_content}\n\n")
+            elif text_content:
                 is_valid_json = await check_json_schema(text_content)
                 if is_valid_json:
                     log_file.write(f"{20*'-'} Time: {datetime.now()} {20*'-'} \n")
@@ -1,8 +1,9 @@
+import httpx
 import openai
 
-from clients.base_client import Client
+from clients.base_client import Client, HTTP_LIMITS
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from config import load_configuration
 from loguru import logger
 config = load_configuration()
@@ -15,6 +16,13 @@ class OpenAIClient(Client):
             base_url="https://integrate.api.nvidia.com/v1",  # NVIDIA API base URL
             api_key=config['NVIDIA_API_KEY'],
             timeout=10,  # Set a timeout (in seconds)
+            http_client=httpx.Client(limits=HTTP_LIMITS),  # Reuse connections across requests
+        )
+        self.async_client = AsyncOpenAI(
+            base_url="https://integrate.api.nvidia.com/v1",
+            api_key=config['NVIDIA_API_KEY'],
+            timeout=10,
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS),
         )
         self.model = "meta/llama3-70b-instruct"  # Default model
 
@@ -50,4 +58,41 @@ class OpenAIClient(Client):
         except Exception as e:
             # Log general exceptions
             logger.error(f"Unexpected error during LLM API call: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def async_generate_text(self, system_prompt, prompt, **kwargs):
+        try:
+            logger.info(f"Sending async request to OpenAI API (model: {self.model})...")
+            kwargs.setdefault("model", self.model)
+            response = await self.async_client.chat.completions.create(
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+                **kwargs
+            )
+            logger.info("OpenAI API response received.")
+            text_content = response.choices[0].message.content.strip()
+            logger.debug(f"Generated text: {text_content[:50]}...")
+            return text_content
+        except openai.RateLimitError as e:
+            print(f"OpenAI API request exceeded rate limit: {e}")
+            raise
+        except openai.APIError as e:
+            print(f"OpenAI API returned an API Error: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error during async LLM API call: {e}")
+            raise
+
+    async def async_stream_text(self, system_prompt, prompt, **kwargs):
+        logger.info(f"Streaming request to OpenAI API (model: {self.model})...")
+        kwargs.setdefault("model", self.model)
+        stream = await self.async_client.chat.completions.create(
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            stream=True,
+            **kwargs
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()  # Ends the HTTP response if the caller stops early
@@ -20,22 +20,33 @@ def load_configuration():
 
 COMMIT_MESSAGES_LOG_FILE = "commit_messages.log"
 GENERATED_MESSAGES_LOG_FILE = "generated_messages.log"
+CHECKPOINT_FILE = "ocdg_checkpoint.jsonl"  # Generated messages, one JSON object per line, used by --resume
+RESPONSE_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "ocdg", "responses")  # Disable with --no-cache
 MAX_CONCURRENT_REQUESTS = 4  # Adjust this value based on Ollama's capacity
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32  # Idle connections kept open to the LLM endpoint for reuse
+HTTP_KEEPALIVE_EXPIRY = 300  # Seconds an idle connection is kept before closing
+BATCH_DIFF_THRESHOLD = 1500  # Filtered diffs up to this many characters share a batched LLM request
+BATCH_MAX_CHARS = 6000  # Character budget for all diffs packed into one batched request
+BATCH_MAX_COMMITS = 10  # Maximum number of commits packed into one batched request
 IGNORED_SECTION_PATTERNS = {
     r'venv.*',  # Ignore any path containing 'venv'
-    r'.idea.*'  # Ignore any path containing '.idea'
+    r'.idea.*',  # Ignore any path containing '.idea'
     r'node_modules.*',  # Ignore any path containing 'node_modules'
     r'__pycache__.*',  # Ignore any path containing '__pycache__
 }
+# File extensions to ignore, checked with str.endswith on the lowercased path (no regex needed)
+IGNORED_FILE_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff', '.svg', '.ico', '.raw', '.psd', '.ai',
+    '.xlsx', '.xls', '.docx', '.pptx', '.pdf', '.pack', '.idx', '.ds_store', '.sys', '.ini', '.bat', '.plist',
+    '.exe', '.dll', '.so', '.bin', '.zip', '.rar', '.7z', '.tar', '.gz', '.bz2',
+    '.mp3', '.wav', '.aac', '.flac', '.mp4', '.avi', '.mov', '.wmv', '.flv',
+    '.db', '.sqlitedb', '.mdb', '.ttf', '.otf', '.woff', '.woff2',
+    '.tmp', '.temp', '.swp', '.swo', '.o', '.obj', '.pyc', '.class',
+    '.cer', '.pem', '.crt', '.key', '.conf', '.cfg', '.config',
+    '.env', '.pyo', '.err', '.stderr', '.stdout', '.log', '.cache', '.cached',
+)
+# Other file path patterns to ignore
 IGNORED_LINE_PATTERNS = {
-    r'.*\.(png|jpg|jpeg|gif|bmp|tiff|svg|ico|raw|psd|ai)$',
-    r'.*\.(xlsx|xls|docx|pptx|pdf)$', r'.*\.(pack|idx|DS_Store|sys|ini|bat|plist)$',
-    r'.*\.(exe|dll|so|bin)$', r'.*\.(zip|rar|7z|tar|gz|bz2)$',
-    r'.*\.(mp3|wav|aac|flac)$', r'.*\.(mp4|avi|mov|wmv|flv)$',
-    r'.*\.(db|sqlitedb|mdb)$', r'.*\.(ttf|otf|woff|woff2)$',
-    r'.*\.(tmp|temp|swp|swo)$', r'.*\.(o|obj|pyc|class)$',
-    r'.*\.(cer|pem|crt|key)$', r'.*\.(conf|cfg|config)$',
-    r'.*\.(env)$', r'node_modules', r'.*\.(pyo)$',
+    r'node_modules',
     r'(package-lock\.json|poetry\.lock|yarn\.lock|Gemfile\.lock)',
-    r'.*\.(err|stderr|stdout|log)$', r'.*\.(cache|cached)$'
 }
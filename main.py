@@ -1,25 +1,187 @@
 import argparse
 import asyncio
+import contextlib
+import hashlib
 import json
 import os
 import logging
+import pickle
 import re
+import shelve
+import shlex
+import shutil
+import subprocess
+import sys
 import tempfile
-from typing import Any, List, Dict
+from collections import Counter
+from typing import Any, AsyncIterator, List, Dict, Iterable, Iterator, Tuple
 from jsonschema import validate, ValidationError
 from loguru import logger
 import git
 
 from clients import create_client
 from config import load_configuration, COMMIT_MESSAGES_LOG_FILE, MAX_CONCURRENT_REQUESTS, IGNORED_SECTION_PATTERNS, \
-    IGNORED_LINE_PATTERNS
+    IGNORED_LINE_PATTERNS, IGNORED_FILE_EXTENSIONS, CHECKPOINT_FILE, RESPONSE_CACHE_FILE, BATCH_DIFF_THRESHOLD, BATCH_MAX_CHARS, \
+    BATCH_MAX_COMMITS
 
 
 # Global variable to store log file path
 
+def _fuse_patterns(patterns: Iterable[str]) -> Tuple[re.Pattern, Dict[str, str]]:
+    """
+    Fuses patterns into one alternation so each check needs a single search.
+    Every alternative is a named group; the returned dict maps `match.lastgroup` back to its pattern.
+    """
+    pattern_by_group = {f"p{index}": pattern for index, pattern in enumerate(sorted(patterns))}
+    if not pattern_by_group:
+        return re.compile(r'(?!)'), pattern_by_group  # Never matches, unlike an empty alternation
+    fused = re.compile("|".join(f"(?P<{group}>{pattern})" for group, pattern in pattern_by_group.items()))
+    return fused, pattern_by_group
+
+
 # Define file/folder paths and patterns to ignore ENTIRE SECTIONS
+IGNORED_SECTION_RE, IGNORED_SECTION_GROUPS = _fuse_patterns(IGNORED_SECTION_PATTERNS)
+
+# Define file path patterns to ignore (plain extensions are checked with IGNORED_FILE_EXTENSIONS)
+IGNORED_LINE_RE, IGNORED_LINE_GROUPS = _fuse_patterns(IGNORED_LINE_PATTERNS)
+
+# Starts each commit record in 'git log' output; cannot appear in hashes, names or subjects
+COMMIT_RECORD_SEPARATOR = b"\x1e"
+
+# 'git log --diff-merges' was added in this git version; older git falls back to '-m'
+DIFF_MERGES_MIN_GIT_VERSION = (2, 31)
+GIT_VERSION_RE = re.compile(r'(\d+)\.(\d+)')
+
+DIFF_HEADER_RE = re.compile(r'diff --git a/(.*) b/(.*)')
+# Zero-width split points before each file section and each hunk of a diff
+FILE_BOUNDARY_RE = re.compile(r'^(?=diff --git )', re.MULTILINE)
+HUNK_BOUNDARY_RE = re.compile(r'^(?=@@ )', re.MULTILINE)
+
+# Matches "```" followed by optional language specifier
+CODE_BLOCK_BOUNDARY_RE = re.compile(r'```(?:\w+)?\n')
+
+# Body of the 'git filter-repo --commit-callback' function. filter-repo calls it once per commit in one
+# process, so the hash -> message map is loaded on the first call and kept in a global afterwards.
+FILTER_REPO_COMMIT_CALLBACK = """
+global ocdg_message_map
+try:
+    ocdg_message_map
+except NameError:
+    import pickle
+    with open({map_path!r}, "rb") as map_file:
+        ocdg_message_map = pickle.load(map_file)
+commit.message = ocdg_message_map.get(commit.original_id, commit.message)
+"""
+
+JSON_DECODER = json.JSONDecoder()
+REQUIRED_COMMIT_KEYS = ("short_analysis", "new_commit_title", "new_detailed_commit_message")
+# Tokens of a partially streamed JSON response: complete strings, brackets, and runs of anything else.
+# Nothing matches at a string whose closing quote has not arrived yet.
+STREAMED_JSON_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]|[^"{}\[\]]+')
+
+# Prompt templates are built once; per-request values are filled in with str.format_map,
+# so braces inside diffs or messages are never interpreted.
+SINGLE_COMMIT_SYSTEM_PROMPT = """
+## Role: You are a Git commit message generator.
+## Goal: Analyze code diffs and produce Conventional Commit messages in JSON.
+
+## JSON Structure:
+```json
+{
+ "short_analysis": "...", 
+ "new_commit_title": "...(<type>[optional scope]: <description> - max 50 chars)", 
+ "new_detailed_commit_message": "...(explain what & why, max 72 chars/line, use bullet points)",
+ "code_changes": { 
+  "files_changed": [...], 
+  "functions_modified": [...], 
+  "other_observations": [...] 
+ }}
+```
+IMPORTANT: REQUIRED KEYS IN JSON: ['short_analysis', 'new_commit_title', 'new_detailed_commit_message'].
+
+## Conventional Commit Types: feat, fix, docs, style, refactor, test, chore. 
+## Code Analysis (Required): Note modified lines, new/changed functions/classes, logic changes.
+## Empty Diffs: Return "No code changes detected" for 'short_analysis' and 'new_commit_title'.  
+"""
+
+SINGLE_COMMIT_USER_PROMPT = """
+Analyze this diff and generate a commit message in JSON format.
+Previous commit message: {commit_message}
+Code changes: {partial}
+```
+{diff_chunk}
+```
+"""
+
+COMBINE_SYSTEM_PROMPT = """
+## Role: You are a Git commit message expert, combining multiple messages into one. 
+## Goal: Create a concise, informative commit message in JSON that adheres to Conventional Commits.
+## Input: Multiple JSON-formatted commit messages (see structure below).
+## Output: A single, combined JSON-formatted commit message.
+
+## JSON Structure (for both input and output):
+```json
+{
+ "short_analysis": "...", 
+ "new_commit_title": "...", 
+ "new_detailed_commit_message": "...", 
+ "code_changes": { 
+  "files_changed": [...], 
+  "functions_modified": [...], 
+  "other_observations": [...] 
+ }}
+```
+IMPORTANT: REQUIRED KEYS IN JSON: ['short_analysis', 'new_commit_title', 'new_detailed_commit_message'].
+
+## Key Points:
+* **Analyze the COMBINED impact of all changes, not just individual messages.**
+* **Be concise and technical. Use bullet points in the detailed message.**
+* **Strictly follow Conventional Commits (<https://www.conventionalcommits.org/>) for the title.**
+"""
+
+COMBINE_USER_PROMPT = """
+Combine the following commit messages into a single, well-structured commit message, adhering to the guidelines and 
+JSON format defined in the system prompt.
+```json
+{messages}
+```
+"""
+
+BATCH_SYSTEM_PROMPT = """
+## Role: You are a Git commit message generator.
+## Goal: Analyze several independent code diffs and produce one Conventional Commit message in JSON for each.
+
+## JSON Structure:
+```json
+{
+ "commits": [
+  {
+   "index": 1,
+   "short_analysis": "...",
+   "new_commit_title": "...(<type>[optional scope]: <description> - max 50 chars)",
+   "new_detailed_commit_message": "...(explain what & why, max 72 chars/line, use bullet points)"
+  }
+ ]
+}
+```
+IMPORTANT: RETURN EXACTLY ONE ENTRY PER COMMIT, WITH ITS "index".
+IMPORTANT: REQUIRED KEYS IN EACH ENTRY: ['index', 'short_analysis', 'new_commit_title', 'new_detailed_commit_message'].
+
+## Conventional Commit Types: feat, fix, docs, style, refactor, test, chore.
+## Every commit is independent: never mix changes from different commits.
+## Empty Diffs: Return "No code changes detected" for 'short_analysis' and 'new_commit_title'.
+"""
+
+BATCH_USER_PROMPT = "Analyze these {count} diffs and generate a commit message for each in JSON format.\n{commits}"
+
+BATCH_COMMIT_PROMPT = """
+Commit {index}:
+Previous commit message: {commit_message}
+Code changes:
+```
+{diff}
+```"""
 
-# Define file extensions and patterns to ignore
 
 def user_confirms_rewrite(commit_history):
     """Presents the proposed changes to the user and asks for confirmation."""
@@ -47,69 +209,71 @@ class RepositoryUpdater:
     def __init__(self, repo_path: str):
         self.repo_path = repo_path
         self.repo = git.Repo(repo_path)
+        # Kept inside .git at a fixed path so a later 'main.py --restore' run can find it
+        self.refs_backup_file = os.path.join(self.repo.git_dir, "refs_backup")
 
     def backup_refs(self):
         """Backs up refs using git for-each-ref to a file."""
         try:
-            with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
-                self.refs_backup_file = temp_file.name
-                run_git_command(
-                    [
-                        "for-each-ref",
-                        "--format='%(refname)'",
-                        "refs/heads/",
-                        "refs/remotes/",
-                        "refs/tags/",
-                        ">",
-                        self.refs_backup_file,
-                    ],
-                    self.repo_path,
-                )
-            logging.info("Backed up refs to '.git/refs_backup'")
+            # Written as 'git update-ref --stdin' instructions so restore can replay the file as is.
+            # Symbolic refs (e.g. origin/HEAD) are skipped: updating one updates its target a second time.
+            refs = run_git_command(
+                [
+                    "for-each-ref",
+                    "--format=%(if)%(symref)%(then)%(else)update %(refname) %(objectname)%(end)",
+                    "refs/heads/",
+                    "refs/remotes/",
+                    "refs/tags/",
+                ],
+                self.repo_path,
+            )
+            with open(self.refs_backup_file, "w") as backup_file:
+                backup_file.writelines(line + "\n" for line in refs.splitlines() if line)
+            logging.info(f"Backed up refs to '{self.refs_backup_file}'")
         except Exception as e:
             logging.error(f"Error backing up refs: {e}")
             raise
 
     def restore_refs(self):
         """Restores refs from the backup file."""
+        if not os.path.exists(self.refs_backup_file):
+            logging.warning(f"Refs backup file '{self.refs_backup_file}' not found. Skipping restore.")
+            return
         try:
-            if not hasattr(self, 'refs_backup_file') or not os.path.exists(self.refs_backup_file):
-                logging.warning(
-                    f"Refs backup file not found. Skipping restore."
+            with open(self.refs_backup_file, "r") as backup_file:
+                subprocess.run(
+                    ["git", "update-ref", "--stdin"],
+                    stdin=backup_file,
+                    cwd=self.repo_path,
+                    check=True,
+                    capture_output=True,
+                    text=True,
                 )
-                return
-            run_git_command(
-                ["update-ref", "--stdin", "<", self.refs_backup_file], self.repo_path
-            )
             logging.info("Restored refs from backup.")
-        except Exception as e:
-            logging.error(f"Error restoring refs: {e}")
-            raise
-        finally:
-            # Clean up the backup file after restore attempt
-            if hasattr(self, 'refs_backup_file') and os.path.exists(self.refs_backup_file):
-                os.remove(self.refs_backup_file)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Error restoring refs: {e.stderr}")
+            raise RuntimeError(f"Git command failed: {e.stderr}") from e
 
     def rewrite_commit_messages(self, commit_history: 'CommitHistory'):
-        """Rewrites commit messages using git rebase -i."""
+        """
+        Rewrites commit messages on the current branch. Uses git filter-repo when it is installed,
+        since it rewrites the whole history in one process; otherwise falls back to git filter-branch,
+        which starts the generated filter script once per commit.
+        """
+        # filter-repo ends with 'git reset --hard', which would silently discard uncommitted edits
+        if self.repo.is_dirty(untracked_files=False):
+            raise RuntimeError(
+                "Cannot rewrite commit messages: the working tree has uncommitted changes. Commit or stash them first."
+            )
         try:
             self.backup_refs()
 
-            # Start an interactive rebase
-            rebase_process = self.repo.git.rebase('-i', f'{commit_history.get_oldest_commit().hash}~1',
-                                                  interactive=True)
-
-            # Construct the rebase instructions based on commit messages
-            rebase_instructions = []
-            for commit in commit_history.commits:
-                if commit.new_message:
-                    rebase_instructions.append(f'reword {commit.hash} {commit.new_message}')
+            with tempfile.TemporaryDirectory() as temp_dir:
+                if shutil.which("git-filter-repo"):
+                    self._rewrite_with_filter_repo(commit_history, temp_dir)
                 else:
-                    rebase_instructions.append(f'pick {commit.hash} {commit.message}')
-
-            # Pass the instructions to the rebase process
-            rebase_process.stdin.write('\n'.join(rebase_instructions))
-            rebase_process.stdin.close()
+                    logging.info("git filter-repo not found, falling back to git filter-branch.")
+                    self._rewrite_with_filter_branch(commit_history, temp_dir)
 
             logging.info("Commit messages rewritten successfully.")
 
@@ -118,32 +282,92 @@ class RepositoryUpdater:
             self.restore_refs()  # Attempt restore on error
             raise
 
+    def _rewrite_with_filter_repo(self, commit_history, temp_dir):
+        """Rewrites messages with a single 'git filter-repo' process that loads the message map once."""
+        map_path = os.path.join(temp_dir, "message_map.pickle")
+        with open(map_path, "wb") as map_file:
+            # filter-repo hands the callback bytes, so the map is stored as bytes too
+            pickle.dump(
+                {
+                    commit.hash.encode(): (commit.new_message + "\n").encode("utf-8")
+                    for commit in commit_history.commits
+                    if commit.new_message
+                },
+                map_file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        try:
+            subprocess.run(
+                [
+                    "git",
+                    "filter-repo",
+                    "--force",
+                    "--refs", "HEAD",  # The current branch, or the commit checked out on a detached HEAD
+                    "--commit-callback", FILTER_REPO_COMMIT_CALLBACK.format(map_path=map_path),
+                ],
+                cwd=self.repo_path,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Git command failed: {e.stderr}") from e
+
+    def _rewrite_with_filter_branch(self, commit_history, temp_dir):
+        """Rewrites messages with 'git filter-branch --msg-filter' and the generated filter script."""
+        script_path = os.path.join(temp_dir, "filter_message.py")
+        self.generate_filter_script(commit_history, script_path)
+        try:
+            subprocess.run(
+                [
+                    "git",
+                    "filter-branch",
+                    "--force",
+                    "--msg-filter", f"{shlex.quote(sys.executable)} {shlex.quote(script_path)}",
+                    "HEAD",
+                ],
+                cwd=self.repo_path,
+                env={**os.environ, "FILTER_BRANCH_SQUELCH_WARNING": "1"},
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Git command failed: {e.stderr}") from e
+
     def generate_filter_script(self, commit_history, script_path):
-        """Generates the Python script for git filter-branch."""
+        """
+        Generates the Python script for 'git filter-branch --msg-filter'.
+        The hash -> new message map is pickled next to the script and loaded once at
+        startup, instead of being embedded as a quoted dict literal.
+        """
+        message_map = {
+            commit.hash: commit.new_message
+            for commit in commit_history.commits
+            if commit.new_message
+        }
+        map_path = os.path.splitext(os.path.abspath(script_path))[0] + "_map.pickle"
+        with open(map_path, "wb") as map_file:
+            pickle.dump(message_map, map_file, protocol=pickle.HIGHEST_PROTOCOL)
+
         with open(script_path, "w") as f:
             f.write(
-                """
+                f"""
+import os
+import pickle
 import sys
 
-def filter_message(message):
-    message_map = {
-"""
-            )
-            for commit in commit_history.commits:
-                if commit.new_message:
-                    # Properly escape single quotes in new_message
-                    escaped_message = commit.new_message.replace("'", r"\'")
-                    f.write(f"        '{commit.hash}': '{escaped_message}',\n")
-            f.write(
-                """
-    }
-    commit_hash = sys.stdin.readline().strip()
-    return message_map.get(commit_hash, message)
+with open({map_path!r}, "rb") as map_file:
+    MESSAGE_MAP = pickle.load(map_file)
 
 if __name__ == "__main__":
-    print(filter_message(sys.stdin.readline().strip()))
+    # filter-branch passes the original message on stdin and the original hash in GIT_COMMIT
+    message = sys.stdin.read()
+    new_message = MESSAGE_MAP.get(os.environ.get("GIT_COMMIT", ""))
+    sys.stdout.write(new_message + "\\n" if new_message is not None else message)
 """
             )
+        return map_path
 
 
 class CommitHistory:
@@ -178,54 +402,181 @@ def save_commit_messages_to_log(commit_history: 'CommitHistory'):
     except Exception as e:
         logging.error(f"Failed to save commit messages to log file: {e}")
 
-def filter_diff(diff: str) -> str:
-    """Removes unwanted lines from the diff based on file extensions and patterns."""
-    filtered_lines = []
-    skip_section = False  # Flag to skip entire diff sections
-
-    for line in diff.splitlines():
-        # Section-Level Filtering
-        if line.startswith('diff --git '):
-            # Check if the section should be skipped
-            if any(re.search(pattern, line) for pattern in IGNORED_SECTION_PATTERNS):
-                skip_section = True
-                logging.info(f"Skipping section: {line}")
-                continue # Skip to the next line
-            else:
-                skip_section = False  # Reset the flag for the new section
-                filtered_lines.append(line) # Add the 'diff --git' line if not skipped
+def load_checkpoint(checkpoint_path: str = CHECKPOINT_FILE) -> Dict[str, str]:
+    """Loads previously generated messages from the checkpoint file, keyed by commit hash."""
+    done = {}
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, "r") as checkpoint_file:
+        for line in checkpoint_file:
+            try:
+                entry = json.loads(line)
+                done[entry["hash"]] = entry["new_message"]
+            except (json.JSONDecodeError, KeyError):
+                # A crash mid-write can leave a truncated last line
+                logging.warning(f"Ignoring malformed checkpoint line: {line.strip()}")
+    logging.info(f"Loaded {len(done)} generated messages from '{checkpoint_path}'")
+    return done
+
+
+def save_checkpoint(commit_hash: str, new_message: str, checkpoint_path: str = CHECKPOINT_FILE):
+    """Appends a generated message to the checkpoint file so it survives a crash or abort."""
+    with open(checkpoint_path, "a") as checkpoint_file:
+        checkpoint_file.write(json.dumps({"hash": commit_hash, "new_message": new_message}) + "\n")
+        checkpoint_file.flush()
+
+
+def reuse_checkpointed_messages(commits: List['Commit'], done: Dict[str, str]) -> List['Commit']:
+    """Applies checkpointed messages to their commits and returns the commits that still need one."""
+    pending = []
+    for commit in commits:
+        if commit.hash in done:
+            commit.new_message = done[commit.hash]
+            logger.info(f"Reusing checkpointed message for commit {commit.hash}")
         else:
-            # Only add lines if not skipping the section
-            if not skip_section and not any(re.search(pattern, line) for pattern in IGNORED_LINE_PATTERNS):
-                filtered_lines.append(line)
+            pending.append(commit)
+    return pending
 
-    return "\n".join(filtered_lines)
 
-async def check_json_schema(json_data: str, client: Any) -> bool:
-    """Checks if the JSON response from the LLM conforms to a simplified schema."""
-    try:
-        json_data = json.loads(json_data)
+def make_cache_key(model: str, diff: str, old_description: str) -> str:
+    """Builds the response cache key for a prompt: identical inputs give identical keys."""
+    payload = "\0".join((model, diff, old_description)).encode("utf-8", errors="replace")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
-        # Check for required top-level keys
-        required_keys = ["short_analysis", "new_commit_title", "new_detailed_commit_message"]
-        if not all(key in json_data for key in required_keys):
-            logger.error(f"Missing required keys in JSON: {required_keys}")
-            return False
 
-        # Check for "code_changes" key, but it's not strictly required
-        if "code_changes" in json_data:
-            code_changes = json_data["code_changes"]
-            # Simplified check: code_changes should be a dictionary or a string
-            if not isinstance(code_changes, (dict, str)):
-                logger.error(f"Invalid 'code_changes' type: {type(code_changes)}")
-                return False
+def open_response_cache(cache_path: str = RESPONSE_CACHE_FILE) -> shelve.Shelf:
+    """Opens the on-disk cache of generated messages, creating its directory if needed."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    return shelve.open(cache_path)
+
+
+def _ignored_diff_section(header: str) -> Tuple[str, str] | None:
+    """
+    Decides once per 'diff --git' header whether its whole section is dropped.
+    Returns the level ("section" or "file") and the pattern that matched, or None to keep it.
+    """
+    # Section-Level Filtering
+    match = IGNORED_SECTION_RE.search(header)
+    if match:
+        return "section", IGNORED_SECTION_GROUPS[match.lastgroup]
+    # File-Level Filtering against the paths named in the header
+    paths = DIFF_HEADER_RE.match(header)
+    for path in (paths.groups() if paths else (header,)):
+        lowered_path = path.lower()
+        if lowered_path.endswith(IGNORED_FILE_EXTENSIONS):
+            return "file", next(ext for ext in IGNORED_FILE_EXTENSIONS if lowered_path.endswith(ext))
+        match = IGNORED_LINE_RE.search(path)
+        if match:
+            return "file", IGNORED_LINE_GROUPS[match.lastgroup]
+    return None
+
+
+def filter_diff(diff: str | bytes | Iterable[bytes]) -> str:
+    """Removes unwanted sections from the diff based on file paths, extensions and patterns.
+
+    Accepts either the whole diff or an iterable of its raw lines, so a diff streamed
+    from git is filtered as it arrives without being materialized first. Lines stay
+    bytes until the kept ones are decoded once at the end; only headers are decoded
+    on the way, so skipped sections are never decoded at all.
+    """
+    if isinstance(diff, str):
+        diff = diff.encode("utf-8")
+    lines = diff.splitlines(keepends=True) if isinstance(diff, bytes) else diff
+    filtered_lines = []
+    keep_section = True  # Lines before the first header are kept
+    skipped = {"section": Counter(), "file": Counter()}
+
+    for line in lines:
+        if line.startswith(b'diff --git '):
+            header = line.rstrip(b"\n").decode("utf-8", errors="replace")
+            ignored = _ignored_diff_section(header)
+            keep_section = ignored is None
+            if ignored:
+                level, pattern = ignored
+                skipped[level][pattern] += 1
+                logging.debug("Skipping %s: %s", level, header)
+        if keep_section:
+            filtered_lines.append(line)
+
+    if skipped["section"] or skipped["file"]:
+        logging.info(
+            "filter_diff: skipped %d sections, %d files: %s",
+            skipped["section"].total(),
+            skipped["file"].total(),
+            dict(skipped["section"] + skipped["file"]),
+        )
+    return b"".join(filtered_lines).rstrip(b"\n").decode("utf-8", errors="replace")
 
-        logger.debug("JSON validated successfully against the simplified schema.")
-        return True
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON format: {e}")
+def _validate_commit_json(json_data: Any) -> bool:
+    """Checks if a decoded commit message object conforms to a simplified schema."""
+    # Check for required top-level keys
+    if not isinstance(json_data, dict) or not all(key in json_data for key in REQUIRED_COMMIT_KEYS):
+        logger.error(f"Missing required keys in JSON: {list(REQUIRED_COMMIT_KEYS)}")
         return False
+    if not all(isinstance(json_data[key], str) for key in REQUIRED_COMMIT_KEYS):
+        logger.error(f"Required keys must have string values: {list(REQUIRED_COMMIT_KEYS)}")
+        return False
+
+    # Check for "code_changes" key, but it's not strictly required
+    if "code_changes" in json_data:
+        code_changes = json_data["code_changes"]
+        # Simplified check: code_changes should be a dictionary or a string
+        if not isinstance(code_changes, (dict, str)):
+            logger.error(f"Invalid 'code_changes' type: {type(code_changes)}")
+            return False
+
+    logger.debug("JSON validated successfully against the simplified schema.")
+    return True
+
+
+def _top_level_string_fields(text: str) -> Dict[str, str]:
+    """
+    Finds the complete string fields of the outermost JSON object in a partially streamed response.
+    Keys of nested objects are ignored. Values are returned still escaped, as they appear in the JSON.
+    """
+    fields = {}
+    depth = 0
+    key = None
+    after_colon = False  # Whether the next top-level token is the value of `key`
+    position = text.find("{")
+    while position != -1 and position < len(text):
+        token = STREAMED_JSON_TOKEN_RE.match(text, position)
+        if token is None:
+            break  # The rest of the string has not been streamed yet
+        position = token.end()
+        value = token.group()
+        if value in ("{", "["):
+            depth += 1
+        elif value in ("}", "]"):
+            depth -= 1
+            if depth == 0:
+                break  # The outermost object is complete
+            after_colon = after_colon and depth > 1  # A nested value just ended
+        elif depth != 1:
+            continue
+        elif value.startswith('"'):
+            if after_colon:
+                fields.setdefault(key, value[1:-1])
+            else:
+                key = value[1:-1]
+            after_colon = False
+        else:
+            after_colon = value.rfind(":") > value.rfind(",")
+    return fields
+
+
+def _parse_json_object(text: str) -> Any:
+    """
+    Decodes the first JSON object in an LLM response, skipping any prose or code fences around it.
+    The C decoder finds where the object ends, so no manual brace matching or second parse is needed.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise json.JSONDecodeError("No JSON object found", text, 0)
+    json_object, _ = JSON_DECODER.raw_decode(text, start)
+    return json_object
+
 
 def run_git_command(command: List[str], repo_path: str = ".") -> str:
     """Executes a Git command and returns the output."""
@@ -238,6 +589,71 @@ def run_git_command(command: List[str], repo_path: str = ".") -> str:
         raise RuntimeError(f"Git command failed: {e.stderr}") from e
 
 
+def run_git_command_stream(command: List[str], repo_path: str = ".") -> Iterator[bytes]:
+    """
+    Executes a Git command and yields its raw output line by line while git is still running.
+    Lines are left undecoded so callers only pay for decoding what they keep.
+    """
+    logger.debug(f"Streaming git command: git {' '.join(command)}")
+    # stderr goes to a file rather than a pipe: nothing reads it while stdout is streamed,
+    # so a full stderr pipe (e.g. many rename-limit warnings) would block git forever.
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(
+            ["git", *command],
+            cwd=repo_path,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+        ) as process:
+            try:
+                yield from process.stdout
+            except GeneratorExit:
+                # The consumer stopped early, don't wait for git to produce the rest
+                process.kill()
+                raise
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            raise RuntimeError(f"Git command failed: {stderr_file.read().decode('utf-8', errors='replace')}")
+
+
+def _read_record_diff(lines: Iterator[bytes], record_end: List[bytes]) -> Iterator[bytes]:
+    """
+    Yields the diff lines of one commit record from a 'git log -p' stream, without the blank line before them.
+    Stops at the next record's separator line, which is appended to `record_end`.
+    """
+    diff_started = False
+    for line in lines:
+        if line.startswith(COMMIT_RECORD_SEPARATOR):
+            record_end.append(line)
+            return
+        if diff_started or line.strip():
+            diff_started = True
+            yield line
+
+
+def _iter_commit_records(lines: Iterable[bytes]) -> Iterator[Tuple[str, List[str], str, str, Iterator[bytes]]]:
+    """
+    Splits streamed 'git log -p' output into commit records as it arrives.
+    Yields (hash, parents, author, subject, diff lines) tuples. The diff lines are a lazy iterator over
+    the same stream: they must be read before the next record is requested, and any left unread are skipped.
+    """
+    lines = iter(lines)
+    record_start = next(lines, None)
+    while record_start is not None:
+        if not record_start.startswith(COMMIT_RECORD_SEPARATOR):
+            record_start = next(lines, None)  # Not part of any record
+            continue
+        commit_hash = record_start[1:].strip().decode("ascii")
+        parents, author, subject = (
+            next(lines, b"").rstrip(b"\n").decode("utf-8", errors="replace") for _ in range(3)
+        )
+        record_end = []
+        yield commit_hash, parents.split(), author, subject, _read_record_diff(lines, record_end)
+        if not record_end:
+            for _ in _read_record_diff(lines, record_end):
+                pass  # Skip what the consumer left unread
+        record_start = record_end[0] if record_end else None
+
+
 def validate_repo_path(repo_path: str):
     """Checks if the provided path is a valid Git repository."""
     if not os.path.isdir(repo_path):
@@ -254,13 +670,10 @@ def _split_text_at_boundaries(text: str, max_chunk_size: int = 7900) -> List[str
     logger.debug(f"Full text being split: \n{text}\n") # Print the full diff for inspection
     try:
 
-        # Define a regular expression to find code block boundaries
-        code_block_boundary = re.compile(r'```(?:\w+)?\n')  # Matches "```" followed by optional language specifier
-
         chunks = []
         current_chunk = ""
         last_split_index = 0
-        for match in code_block_boundary.finditer(text):
+        for match in CODE_BLOCK_BOUNDARY_RE.finditer(text):
             end_index = match.start()
             chunk = text[last_split_index:end_index]
 
@@ -326,6 +739,86 @@ def _split_text_aggressively(text: str, max_chunk_size: int = 7900, overlap: int
         raise
 
 
+def _split_diff_at_file_boundaries(diff: str, max_chunk_size: int = 7900) -> List[str]:
+    """
+    Splits a diff into chunks of whole files, packing as many files per chunk as fit.
+    A file larger than the chunk size is split at hunk boundaries, and a hunk larger
+    than that at line boundaries, so chunks never cut through the middle of a line.
+    """
+    pieces = []
+    for file_block in FILE_BOUNDARY_RE.split(diff):
+        if len(file_block) <= max_chunk_size:
+            pieces.append(file_block)
+            continue
+        hunks = HUNK_BOUNDARY_RE.split(file_block)
+        if len(hunks) > 1:
+            hunks[:2] = [hunks[0] + hunks[1]]  # Keep the file header with its first hunk
+        for hunk in hunks:
+            if len(hunk) <= max_chunk_size:
+                pieces.append(hunk)
+                continue
+            for line in hunk.splitlines(keepends=True):
+                pieces.extend(line[i:i + max_chunk_size] for i in range(0, len(line), max_chunk_size))
+
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for piece in pieces:
+        if not piece:
+            continue
+        if current_chunk and current_size + len(piece) > max_chunk_size:
+            chunks.append("".join(current_chunk))
+            current_chunk = []
+            current_size = 0
+        current_chunk.append(piece)
+        current_size += len(piece)
+    if current_chunk:
+        chunks.append("".join(current_chunk))
+
+    logger.info(f"Split diff into {len(chunks)} chunks at file boundaries.")
+    return chunks
+
+
+async def _stream_commit_json(client: Any, system_prompt: str, user_prompt: str, stop_early: bool = True) -> Any:
+    """
+    Streams a JSON commit message from the LLM. With `stop_early`, returns as soon as all required fields
+    are complete, without waiting for the rest of the response (e.g. code_changes); otherwise, or if the
+    fields never complete, parses the whole response.
+    """
+    response = ""
+    async with contextlib.aclosing(client.async_stream_text(system_prompt, user_prompt)) as stream:
+        async for delta in stream:
+            response += delta
+            if not stop_early or '"' not in delta:
+                continue  # Reading the whole response, or no closing quote completed a string value
+            fields = _top_level_string_fields(response)
+            if all(key in fields for key in REQUIRED_COMMIT_KEYS):
+                logger.info("Required fields received, closing the LLM stream early.")
+                return {key: json.loads(f'"{fields[key]}"', strict=False) for key in REQUIRED_COMMIT_KEYS}
+    return _parse_json_object(response)
+
+
+async def _request_commit_json(
+    client: Any, system_prompt: str, user_prompt: str, attempts: int = 3, stop_early: bool = True
+) -> Dict[str, str]:
+    """
+    Requests a commit message in JSON, retrying on invalid responses. Returns {} if every attempt fails.
+    Pass `stop_early=False` when the whole response is needed, e.g. code_changes for combine_messages.
+    """
+    for count in range(1, attempts + 1):
+        try:
+            generated_message = await _stream_commit_json(client, system_prompt, user_prompt, stop_early)
+        except json.JSONDecodeError as e:
+            logger.error(f"Error decoding JSON: {e} - {e.doc}")
+            generated_message = None
+        if generated_message is not None and _validate_commit_json(generated_message):
+            logger.success(f"Valid JSON found in response: {generated_message}")
+            return generated_message
+        # Handle invalid JSON (log, retry, or attempt to fix)
+        logger.warning(f"Invalid JSON response from LLM. Trying number {count}/{attempts} Skipping...")
+    return {}
+
+
 async def _generate_single_commit_message_json(
     diff_chunk: str,
     commit_message: str,
@@ -333,71 +826,29 @@ async def _generate_single_commit_message_json(
     model: str,
     chunk_index: int,
     total_chunks: int,
+    stop_early: bool = True,
 ) -> Dict[str, str]:
     """
     Generates a single commit message in JSON format, handling potential JSON decoding errors.
     """
-    system_prompt = """
-## Role: You are a Git commit message generator.
-## Goal: Analyze code diffs and produce Conventional Commit messages in JSON.
-
-## JSON Structure:
-```json
-{
- "short_analysis": "...", 
- "new_commit_title": "...(<type>[optional scope]: <description> - max 50 chars)", 
- "new_detailed_commit_message": "...(explain what & why, max 72 chars/line, use bullet points)",
- "code_changes": { 
-  "files_changed": [...], 
-  "functions_modified": [...], 
-  "other_observations": [...] 
- }}
-```
-IMPORTANT: REQUIRED KEYS IN JSON: ['short_analysis', 'new_commit_title', 'new_detailed_commit_message'].
-
-## Conventional Commit Types: feat, fix, docs, style, refactor, test, chore. 
-## Code Analysis (Required): Note modified lines, new/changed functions/classes, logic changes.
-## Empty Diffs: Return "No code changes detected" for 'short_analysis' and 'new_commit_title'.  
-"""
-    # User Prompt Template
-    user_prompt = f"""
-Analyze this diff and generate a commit message in JSON format.
-Previous commit message: {commit_message}
-Code changes: {'(partial)' if chunk_index != total_chunks - 1 else ''}
-```
-{diff_chunk}
-```
-"""
-    try:
-        is_valid_json = False
-        count = 0
-        while is_valid_json is False and count < 3:
-            chat_completion = await client.async_generate_text(system_prompt, user_prompt)
-            is_valid_json = await check_json_schema(chat_completion, client)
-            if is_valid_json:
-                # Extract JSON
-                logger.success(f"Valid JSON found in response: {chat_completion}")
-                return json.loads(chat_completion)
-            else:
-                count += 1
-                # Handle invalid JSON (log, retry, or attempt to fix)
-                logger.warning(f"Invalid JSON response from LLM. Trying number {count}/3 Skipping...")
-
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON: {e} - {chat_completion}")
-        return {}
+    user_prompt = SINGLE_COMMIT_USER_PROMPT.format_map({
+        "commit_message": commit_message,
+        "partial": "(partial)" if chunk_index != total_chunks - 1 else "",
+        "diff_chunk": diff_chunk,
+    })
+    return await _request_commit_json(client, SINGLE_COMMIT_SYSTEM_PROMPT, user_prompt, stop_early=stop_early)
 
 async def _generate_commit_message_parts(diff: str, commit_message: str, client: Any, model: str, chunk_size: int = 7900) -> List[Dict[str, str]]:
     """Splits a diff into chunks and generates a commit message for each chunk."""
     logger.info("Split diff into chunks")
     try:
-        diff_chunks = [diff[i:i + chunk_size] for i in range(0, len(diff), chunk_size)]
-        # diff_chunks = list(_split_text_aggressively(diff, chunk_size))
+        diff_chunks = _split_diff_at_file_boundaries(diff, chunk_size)
         commit_messages = []
         for i, diff_chunk in enumerate(diff_chunks):
             commit_messages.append(
                 await _generate_single_commit_message_json(
-                    diff_chunk, commit_message, client, model, i, len(diff_chunks)
+                    # combine_messages analyzes the code_changes of every part, so read whole responses
+                    diff_chunk, commit_message, client, model, i, len(diff_chunks), stop_early=False
                 )
             )
         logger.success(f"Generated {len(commit_messages)} commit messages.")
@@ -409,58 +860,51 @@ async def _generate_commit_message_parts(diff: str, commit_message: str, client:
 
 async def combine_messages(multi_commit: List[Dict[str, str]], client: Any, model: str) -> dict:
     """Combines multiple commit messages into a single commit message."""
-    system_prompt = f"""
-## Role: You are a Git commit message expert, combining multiple messages into one. 
-## Goal: Create a concise, informative commit message in JSON that adheres to Conventional Commits.
-## Input: Multiple JSON-formatted commit messages (see structure below).
-## Output: A single, combined JSON-formatted commit message.
+    user_prompt = COMBINE_USER_PROMPT.format_map({"messages": json.dumps(multi_commit)})
+    return await _request_commit_json(client, COMBINE_SYSTEM_PROMPT, user_prompt)
 
-## JSON Structure (for both input and output):
-```json
-{
- "short_analysis": "...", 
- "new_commit_title": "...", 
- "new_detailed_commit_message": "...", 
- "code_changes": { 
-  "files_changed": [...], 
-  "functions_modified": [...], 
-  "other_observations": [...] 
- }}
-```
-IMPORTANT: REQUIRED KEYS IN JSON: ['short_analysis', 'new_commit_title', 'new_detailed_commit_message'].
 
-## Key Points:
-* **Analyze the COMBINED impact of all changes, not just individual messages.**
-* **Be concise and technical. Use bullet points in the detailed message.**
-* **Strictly follow Conventional Commits (<https://www.conventionalcommits.org/>) for the title.**
-"""
-    user_prompt = f"""
-Combine the following commit messages into a single, well-structured commit message, adhering to the guidelines and 
-JSON format defined in the system prompt.
-```json
-{json.dumps(multi_commit)}
-```
-"""
-    combined_message = await client.async_generate_text(
-        system_prompt, user_prompt
-    )
-    try:
-        is_valid_json = False
-        count = 0
-        while is_valid_json is False and count < 3:
-            combined_message = await client.async_generate_text(system_prompt, user_prompt)
-            is_valid_json = await check_json_schema(combined_message, client)
-            if is_valid_json:
-                logger.success(f"Valid JSON found in response: {combined_message}")
-                return json.loads(combined_message)
-            else:
-                count += 1
-                # Handle invalid JSON (log, retry, or attempt to fix)
-                logger.warning(f"Invalid JSON response from LLM. Trying number {count}/3 Skipping...")
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON: {e} - {combined_message}")
-        return {}
 
+async def _generate_commit_batch_json(
+    batch: List[Tuple[str, str]],
+    client: Any,
+    model: str,
+) -> Dict[int, Dict[str, str]]:
+    """
+    Generates commit messages for several small diffs with a single LLM request.
+    Takes (diff, old message) pairs and returns the valid messages keyed by their index in the batch.
+    """
+    user_prompt = BATCH_USER_PROMPT.format_map({
+        "count": len(batch),
+        "commits": "\n".join(
+            BATCH_COMMIT_PROMPT.format_map({"index": index, "commit_message": commit_message, "diff": diff})
+            for index, (diff, commit_message) in enumerate(batch, start=1)
+        ),
+    })
+
+    generated = {}
+    try:
+        chat_completion = await client.async_generate_text(BATCH_SYSTEM_PROMPT, user_prompt)
+        for entry in _parse_json_object(chat_completion).get("commits", []):
+            index = entry.get("index") if isinstance(entry, dict) else None
+            if isinstance(index, int) and 1 <= index <= len(batch) and _validate_commit_json(entry):
+                generated[index - 1] = entry
+    except Exception as e:
+        # Every commit of a failed batch falls back to a request of its own
+        logger.error(f"Error generating batched commit messages: {e}")
+    logger.info(f"Batched request returned {len(generated)}/{len(batch)} valid commit messages.")
+    return generated
+
+
+def _format_commit_message(generated_message: Dict[str, str]) -> str:
+    """Joins the title and detailed message of a generated commit message."""
+    return "\n".join(
+        [
+            generated_message.get("new_commit_title", ""),
+            "",
+            generated_message.get("new_detailed_commit_message", ""),
+        ]
+    ).strip()
 
 
 async def generate_commit_description(diff: str, old_description: str, client: Any, model: str, max_tokens: int = 7900) -> str | None:
@@ -474,18 +918,12 @@ async def generate_commit_description(diff: str, old_description: str, client: A
             if not multi_commit:
                 logger.warning("Failed to generate multi-commit message. Skipping...")
                 return None
-            generated_message = combine_messages(multi_commit, client, model)
+            generated_message = await combine_messages(multi_commit, client, model)
         else:
             generated_message = await _generate_single_commit_message_json(
                 diff, old_description, client, model, 0, 1
             )
-        new_description = "\n".join(
-            [
-                generated_message.get("New Commit Title", ""),
-                "",
-                generated_message.get("New Detailed Commit Message", ""),
-            ]
-        ).strip()
+        new_description = _format_commit_message(generated_message)
 
         if new_description:
             logger.success(f"Generated commit message: {new_description}")
@@ -573,11 +1011,34 @@ class GitAnalyzer:
         return commits
 
 
-    def get_commit_diff(self, commit_hash: str, commit: 'Commit'):
-        """Fetches the diff for a specific commit."""
-        # get_commit_diff = self.repo.git.diff(f"{commit_hash}~1", f"{commit.hash}")
-        # logger.info(f"Get commit diff: {get_commit_diff} /n /n")
-        return self.repo.git.diff(f"{commit_hash}~1", f"{commit.hash}")
+    def get_git_version(self) -> Tuple[int, int]:
+        """Returns the (major, minor) version of the installed git."""
+        match = GIT_VERSION_RE.search(run_git_command(["--version"], self.repo.working_dir))
+        return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+    def iter_commit_diffs(self, limit=None, since=None) -> Iterator[Tuple[str, List[str], str, str, Iterator[bytes]]]:
+        """
+        Streams every commit with its diff from a single 'git log -p' call.
+        Yields (hash, parents, author, subject, raw diff lines) tuples; the diff lines are read lazily from git.
+        """
+        if self.get_git_version() >= DIFF_MERGES_MIN_GIT_VERSION:
+            merge_diffs = "--diff-merges=first-parent"  # Same diff as 'git diff <hash>~1 <hash>' for merges
+        else:
+            # One record per parent, the first parent's first; iter_filtered_diffs keeps only that one
+            merge_diffs = "-m"
+        log_command = [
+            "log",
+            "-p",
+            "--no-color",
+            merge_diffs,
+            "--format=%x1e%H%n%P%n%an <%ae>%n%s",  # %x1e is COMMIT_RECORD_SEPARATOR
+        ]
+        if limit:
+            log_command.append(f"--max-count={limit}")
+        if since:
+            log_command.append(f"--since={since}")
+
+        return _iter_commit_records(run_git_command_stream(log_command, self.repo.working_dir))
 
 
     def update_commit_message(self, commit: 'Commit', new_message: str):
@@ -592,21 +1053,90 @@ class GitAnalyzer:
             logging.error(f"Error updating commit message for commit {commit.hash}: {e}")
             raise
 
-async def process_commit(commit, analyzer, client, model, repo_path, semaphore):
-    """Processes a single commit asynchronously, limited by a semaphore."""
-    async with semaphore:  # Acquire the semaphore, wait if necessary
-        logger.info(f"Processing commit: {commit.hash}")
+class CommitBatcher:
+    """Greedily packs (commit, filtered diff) pairs into batches under a character budget as they arrive."""
+
+    def __init__(self, max_chars: int = BATCH_MAX_CHARS, max_commits: int = BATCH_MAX_COMMITS):
+        self.max_chars = max_chars
+        self.max_commits = max_commits
+        self.batch: List[Tuple['Commit', str]] = []
+        self.chars = 0
+
+    def add(self, commit: 'Commit', filtered_diff: str) -> List[Tuple['Commit', str]] | None:
+        """Adds a commit to the current batch. Returns the previous batch if the commit didn't fit in it."""
+        size = len(filtered_diff) + len(commit.message)
+        completed = None
+        if self.batch and (self.chars + size > self.max_chars or len(self.batch) >= self.max_commits):
+            completed = self.flush()
+        self.batch.append((commit, filtered_diff))
+        self.chars += size
+        return completed
+
+    def flush(self) -> List[Tuple['Commit', str]] | None:
+        """Returns the current batch, if it has any commits, and starts a new one."""
+        completed = self.batch or None
+        self.batch = []
+        self.chars = 0
+        return completed
+
+
+def _response_cache_key(commit, filtered_diff, client, model) -> str:
+    """Builds the response cache key for generating this commit's message."""
+    return make_cache_key(f"{type(client).__name__}:{model}", filtered_diff, commit.message)
+
+
+def _store_message(commit, new_message, cache=None, cache_key=None):
+    """Stores a generated message on the commit, in the checkpoint and in the response cache."""
+    commit.new_message = new_message
+    save_checkpoint(commit.hash, new_message)
+    if cache is not None and cache_key is not None:
+        cache[cache_key] = new_message
+
+
+def reuse_cached_message(commit, filtered_diff, client, model, cache) -> bool:
+    """Applies a cached message to the commit if one exists. Returns True on a cache hit."""
+    if cache is None:
+        return False
+    cache_key = _response_cache_key(commit, filtered_diff, client, model)
+    if cache_key not in cache:
+        return False
+    _store_message(commit, cache[cache_key])
+    logger.info(f"Using cached message for commit {commit.hash}")
+    return True
 
-        # 1. Get the Diff (fetch diff here)
-        initial_commit_hash = run_git_command(['rev-list', '--max-parents=0', 'HEAD'], repo_path).strip()
-        if commit.hash == initial_commit_hash:
-            logger.info(f"Skipping diff for initial commit: {commit.hash}")
-            diff = ""  # Or handle the initial commit differently
+
+def iter_filtered_diffs(analyzer, commits) -> Iterator[Tuple['Commit', str]]:
+    """
+    Streams the filtered diffs of the given commits from a single 'git log -p', in log order.
+    Each diff is filtered while git produces it, so skipped sections are never held in memory.
+    """
+    wanted = {commit.hash: commit for commit in commits}
+    if not wanted:
+        return
+    for commit_hash, parents, _, _, diff_lines in analyzer.iter_commit_diffs():
+        commit = wanted.pop(commit_hash, None)
+        if commit is None:
+            continue  # Not pending, or a merge's extra record from 'git log -m' on older git
+        if not parents:
+            logger.info(f"Skipping diff for initial commit: {commit_hash}")
+            yield commit, ""
         else:
-            diff = analyzer.get_commit_diff(commit.hash, commit)
+            yield commit, filter_diff(diff_lines)
+        if not wanted:
+            break  # Stops git early when only part of the history is pending
 
-        # 2. Filter the Diff
-        filtered_diff = filter_diff(diff)
+
+async def stream_filtered_diffs(analyzer, commits) -> AsyncIterator[Tuple['Commit', str]]:
+    """Yields (commit, filtered diff) pairs as git produces them, reading git off the event loop."""
+    filtered_diffs = iter_filtered_diffs(analyzer, commits)
+    while (item := await asyncio.to_thread(next, filtered_diffs, None)) is not None:
+        yield item
+
+
+async def process_commit(commit, filtered_diff, client, model, semaphore, cache=None):
+    """Generates a message for a single commit asynchronously, limited by a semaphore."""
+    async with semaphore:  # Acquire the semaphore, wait if necessary
+        logger.info(f"Processing commit: {commit.hash}")
 
         # 3. Generate New Commit Message (using await)
         new_message = await generate_commit_description(
@@ -619,8 +1149,31 @@ async def process_commit(commit, analyzer, client, model, repo_path, semaphore):
                 f"Skipping commit {commit.hash} - No new message generated"
             )
         else:
-            commit.new_message = new_message  # Store the new message
+            _store_message(commit, new_message, cache, _response_cache_key(commit, filtered_diff, client, model))
+            logger.info(f"New message generated for commit {commit.hash}")
+
+
+async def process_commit_batch(batch, client, model, semaphore, cache=None):
+    """Generates messages for a batch of small commits with one request, limited by a semaphore."""
+    async with semaphore:  # Acquire the semaphore, wait if necessary
+        logger.info(f"Processing batch of {len(batch)} commits: {', '.join(commit.hash for commit, _ in batch)}")
+        generated = await _generate_commit_batch_json(
+            [(filtered_diff, commit.message) for commit, filtered_diff in batch], client, model
+        )
+
+    leftovers = []
+    for index, (commit, filtered_diff) in enumerate(batch):
+        new_message = _format_commit_message(generated[index]) if index in generated else None
+        if new_message:
+            _store_message(commit, new_message, cache, _response_cache_key(commit, filtered_diff, client, model))
             logger.info(f"New message generated for commit {commit.hash}")
+        else:
+            leftovers.append((commit, filtered_diff))
+
+    # Commits the batched answer missed fall back to a request of their own
+    await asyncio.gather(
+        *(process_commit(commit, filtered_diff, client, model, semaphore, cache) for commit, filtered_diff in leftovers)
+    )
 
 async def main():
     # Parse command-line arguments
@@ -638,6 +1191,12 @@ async def main():
         action="store_true",
         help="Restore refs from backup before proceeding.",
     )
+    parser.add_argument("-c", "--max-concurrency", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Maximum number of concurrent LLM requests.")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Reuse messages already generated in '{CHECKPOINT_FILE}' instead of regenerating them.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Always query the LLM instead of reusing responses cached in '{RESPONSE_CACHE_FILE}'.")
     # Add more arguments as needed...
     args = parser.parse_args()
 
@@ -705,9 +1264,35 @@ async def main():
     logging.info(f"Initialized LLM client: {client}")
 
     # 4. Process each commit asynchronously, limited by semaphore
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-    tasks = [process_commit(commit, analyzer, client, args.model, repo_path, semaphore) for commit in commits]
-    await asyncio.gather(*tasks)  # Execute tasks concurrently
+    done = load_checkpoint() if args.resume else {}
+    cache = None if args.no_cache else open_response_cache()
+    semaphore = asyncio.Semaphore(args.max_concurrency)
+    try:
+        pending = reuse_checkpointed_messages(commits, done)
+
+        # One git process streams all diffs; each request starts as soon as its diff is ready
+        tasks = []
+        batcher = CommitBatcher()
+        async for commit, filtered_diff in stream_filtered_diffs(analyzer, pending):
+            if reuse_cached_message(commit, filtered_diff, client, args.model, cache):
+                continue
+            # Large diffs get a request of their own, small ones share batched requests
+            if len(filtered_diff) > BATCH_DIFF_THRESHOLD:
+                request = process_commit(commit, filtered_diff, client, args.model, semaphore, cache)
+            elif batch := batcher.add(commit, filtered_diff):
+                request = process_commit_batch(batch, client, args.model, semaphore, cache)
+            else:
+                continue  # Waits for more small commits to fill the batch
+            tasks.append(asyncio.create_task(request))
+        if batch := batcher.flush():
+            tasks.append(asyncio.create_task(process_commit_batch(batch, client, args.model, semaphore, cache)))
+
+        for processed, task in enumerate(asyncio.as_completed(tasks), start=1):  # Wait for requests as they finish
+            await task
+            logger.info(f"Processed {processed}/{len(tasks)} requests")
+    finally:
+        if cache is not None:
+            cache.close()
 
     # 5. User Confirmation before Rewrite
     if user_confirms_rewrite(commit_history):
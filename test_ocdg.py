@@ -1,6 +1,10 @@
+import asyncio
 import os
 import json
+import shutil
+import subprocess
 import tempfile
+import threading
 from unittest.mock import MagicMock
 
 import git
@@ -18,10 +22,27 @@ from main import (
     _split_text_at_boundaries,
     _split_diff_intelligently,
     _split_text_aggressively,
+    _split_diff_at_file_boundaries,
     _generate_single_commit_message_json,
     _generate_commit_message_parts,
     combine_messages,
     generate_commit_description,
+    CommitBatcher,
+    _iter_commit_records,
+    _parse_json_object,
+    load_checkpoint,
+    save_checkpoint,
+    reuse_checkpointed_messages,
+    make_cache_key,
+    open_response_cache,
+    reuse_cached_message,
+    _response_cache_key,
+    _store_message,
+    process_commit_batch,
+    _validate_commit_json,
+    _stream_commit_json,
+    run_git_command_stream,
+    iter_filtered_diffs,
     Commit,
     GitAnalyzer,
 )
@@ -399,6 +420,352 @@ def test_git_analyzer(temp_repo_path, mock_git_repo):
     # in the 'mock_git_repo'. You might need to inspect the calls made to 'mock_git.execute'.
 
 
+def test_filter_diff_skips_ignored_sections():
+    """Test that whole diff sections are dropped for ignored paths and file types."""
+    diff = (
+        "diff --git a/some/path/file.py b/some/path/file.py\n"
+        "@@ -1,2 +1,2 @@\n"
+        "-print(\"old code\")\n"
+        "+print(\"new code\")\n"
+        "diff --git a/venv/some/other/file.py b/venv/some/other/file.py\n"
+        "+print(\"new code in venv\")\n"
+        "diff --git a/image.jpg b/image.jpg\n"
+        "Binary files a/image.jpg and b/image.jpg differ\n"
+    )
+    filtered_diff = filter_diff(diff)  # Filter the diff.
+    assert "new code" in filtered_diff  # The regular file section is kept.
+    assert "venv" not in filtered_diff  # The venv section is removed.
+    assert "image.jpg" not in filtered_diff  # The binary file section is removed.
+
+
+def test_split_diff_at_file_boundaries():
+    """Test that diff chunks are cut between files, then between hunks, never mid-line."""
+    small_file = "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n+a\n"
+    large_file = "diff --git a/b.py b/b.py\n" + "".join(f"@@ -{i} +{i} @@\n+{'b' * 30}\n" for i in range(4))
+    chunks = _split_diff_at_file_boundaries(small_file + large_file, max_chunk_size=100)  # Split the diff.
+    assert "".join(chunks) == small_file + large_file  # Nothing is lost or duplicated.
+    assert all(len(chunk) <= 100 for chunk in chunks)  # All chunks are within the size limit.
+    assert chunks[0] == small_file  # The small file stays whole.
+    assert chunks[1].startswith("diff --git a/b.py")  # The large file header stays with its first hunk.
+    assert all(chunk.endswith("\n") for chunk in chunks)  # Chunks end on line boundaries.
+
+
+def test_parse_json_object_ignores_surrounding_text():
+    """Test extracting the JSON object from an LLM response wrapped in prose and code fences."""
+    response = 'Here it is:\n```json\n{"new_commit_title": "fix: braces }{ in strings", "code_changes": {}}\n```'
+    parsed = _parse_json_object(response)  # Parse the response.
+    assert parsed == {"new_commit_title": "fix: braces }{ in strings", "code_changes": {}}
+    with pytest.raises(json.JSONDecodeError):
+        _parse_json_object("No JSON here")  # A response without an object is rejected.
+
+
+def test_commit_batcher():
+    """Test packing small commits into batches under a character budget as they arrive."""
+    commits = [Commit(f"hash{i}", "Author", "2024-01-20", "msg", repo=MagicMock()) for i in range(5)]
+    batcher = CommitBatcher(max_chars=100, max_commits=10)
+    batches = [batch for commit in commits if (batch := batcher.add(commit, "x" * 40))]  # Each costs 43.
+    batches.append(batcher.flush())  # The last, partly filled batch.
+    assert [len(batch) for batch in batches] == [2, 2, 1]  # No batch exceeds the budget.
+    assert [commit for batch in batches for commit, _ in batch] == commits  # Order is preserved.
+    assert batcher.flush() is None  # Nothing is left after flushing.
+
+
+def test_iter_commit_records():
+    """Test splitting streamed 'git log -p' output into commit records."""
+    output = (
+        b"\x1emerge_hash\nparent_a parent_b\nAuthor <a@example.com>\nMerge branch 'side'\n\n"
+        b"diff --git a/b.py b/b.py\n+b = '\x1e is only a separator at the start of a line'\n"
+        b"\x1eempty_hash\nroot_hash\nAuthor <a@example.com>\nEmpty commit\n"
+        b"\x1eroot_hash\n\nAuthor <a@example.com>\nInitial commit\n\n"
+        b"diff --git a/a.py b/a.py\n+a = 1\n"
+    )
+    records = _iter_commit_records(output.splitlines(keepends=True))
+
+    commit_hash, parents, author, subject, diff_lines = next(records)
+    assert (commit_hash, parents, author, subject) == (
+        "merge_hash", ["parent_a", "parent_b"], "Author <a@example.com>", "Merge branch 'side'"
+    )
+    diff = b"".join(diff_lines)
+    assert diff.startswith(b"diff --git a/b.py")  # The blank line before the diff is dropped.
+    assert b"\x1e is only" in diff  # A separator inside a line doesn't start a new record.
+
+    commit_hash, parents, _, subject, diff_lines = next(records)
+    assert (commit_hash, parents, subject, list(diff_lines)) == ("empty_hash", ["root_hash"], "Empty commit", [])
+
+    commit_hash, parents, _, subject, _ = next(records)  # Leave the root commit's diff unread.
+    assert (commit_hash, parents, subject) == ("root_hash", [], "Initial commit")
+    assert next(records, None) is None  # The unread diff is skipped, not taken for another record.
+
+
+def test_checkpoint_round_trip_skips_truncated_line(tmp_path):
+    """Test that saved messages load back and a truncated last line is ignored."""
+    checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+    assert load_checkpoint(checkpoint_path) == {}  # A missing checkpoint loads as empty.
+    save_checkpoint("hash1", "feat: first\n\nDetails", checkpoint_path)
+    save_checkpoint("hash2", "fix: second", checkpoint_path)
+    with open(checkpoint_path, "a") as checkpoint_file:
+        checkpoint_file.write('{"hash": "hash3", "new_mes')  # Simulate a crash mid-write.
+    assert load_checkpoint(checkpoint_path) == {"hash1": "feat: first\n\nDetails", "hash2": "fix: second"}
+
+
+def test_reuse_checkpointed_messages(commit_history):
+    """Test that --resume applies checkpointed messages and leaves only the other commits pending."""
+    pending = reuse_checkpointed_messages(commit_history.commits, {"hash1": "feat: reused"})
+    assert commit_history.commits[0].new_message == "feat: reused"  # The checkpointed message is applied.
+    assert pending == [commit_history.commits[1]]  # Only the commit without a message is left.
+
+
+def test_make_cache_key_is_stable():
+    """Test that identical prompt inputs give the same cache key and any change gives another."""
+    key = make_cache_key("OllamaClient:llama3", "diff", "old message")
+    assert key == make_cache_key("OllamaClient:llama3", "diff", "old message")  # Stable across calls.
+    assert key != make_cache_key("OllamaClient:llama3", "diff", "other message")
+    assert key != make_cache_key("OllamaClient:llama3", "other diff", "old message")
+    assert key != make_cache_key("GroqClient:llama3", "diff", "old message")
+
+
+def test_response_cache_hit_and_miss(tmp_path, monkeypatch, commit_history):
+    """Test that a stored message is reused for the same diff and not for a different one."""
+    monkeypatch.chdir(tmp_path)  # _store_message also writes the checkpoint to the working directory.
+    client = MagicMock()
+    commit, other_commit = commit_history.commits
+    cache = open_response_cache(str(tmp_path / "cache" / "responses"))
+    try:
+        assert not reuse_cached_message(commit, "diff", client, "model", cache)  # Nothing cached yet.
+        _store_message(commit, "feat: cached", cache, _response_cache_key(commit, "diff", client, "model"))
+        commit.new_message = None
+        assert reuse_cached_message(commit, "diff", client, "model", cache)  # Same inputs hit the cache.
+        assert commit.new_message == "feat: cached"
+        assert not reuse_cached_message(commit, "changed diff", client, "model", cache)  # A new diff misses.
+        assert not reuse_cached_message(other_commit, "diff", client, "model", cache)  # So does a new message.
+        assert not reuse_cached_message(commit, "diff", client, "model", None)  # --no-cache never hits.
+    finally:
+        cache.close()
+
+
+class FailingBatchClient:
+    """Fake LLM client whose batched requests fail while single-commit requests succeed."""
+
+    async def async_generate_text(self, system_prompt, prompt, **kwargs):
+        raise ConnectionError("Connection reset by peer")  # Simulate a transport error.
+
+    async def async_stream_text(self, system_prompt, prompt, **kwargs):
+        yield json.dumps(
+            {
+                "short_analysis": "Mocked analysis",
+                "new_commit_title": "fix: single request",
+                "new_detailed_commit_message": "Generated without batching.",
+            }
+        )
+
+
+def test_process_commit_batch_falls_back_when_batch_request_fails(tmp_path, monkeypatch, commit_history):
+    """Test that a failed batched request falls back to one request per commit instead of raising."""
+    monkeypatch.chdir(tmp_path)  # Generated messages are checkpointed in the working directory.
+    batch = [(commit, "small diff") for commit in commit_history.commits]
+
+    async def run_batch():
+        await process_commit_batch(batch, FailingBatchClient(), "model", asyncio.Semaphore(2))
+
+    asyncio.run(run_batch())  # Must not raise.
+    assert [commit.new_message for commit in commit_history.commits] == [
+        "fix: single request\n\nGenerated without batching."
+    ] * 2
+    assert not _validate_commit_json(
+        {"short_analysis": "", "new_commit_title": ["not", "a", "string"], "new_detailed_commit_message": ""}
+    )  # A non-string title is treated as an invalid entry.
+
+
+def git_test_command(repo_path, *args):
+    """Runs a git command in a test repository and returns its output."""
+    return subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=repo_path,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+@pytest.fixture  # Define a fixture to create a clone of a small real repository.
+def cloned_repo_path(tmp_path):
+    """Fixture to create a cloned repository, so it has remote refs and the origin/HEAD symref."""
+    origin_path = tmp_path / "origin"
+    origin_path.mkdir()
+    git_test_command(origin_path, "init", "-q", "-b", "main")
+    for message in ("Initial commit", "Second commit"):
+        git_test_command(origin_path, "commit", "-q", "--allow-empty", "-m", message)
+    git_test_command(tmp_path, "clone", "-q", str(origin_path), "clone")
+    return str(tmp_path / "clone")
+
+
+def test_repository_updater_backup_restore_in_clone(cloned_repo_path):
+    """Test that refs moved after a backup are restored, also by a new updater as with --restore."""
+    original_main = git_test_command(cloned_repo_path, "rev-parse", "refs/heads/main")
+    previous_commit = git_test_command(cloned_repo_path, "rev-parse", "HEAD~1")
+    RepositoryUpdater(cloned_repo_path).backup_refs()  # Back up the refs.
+
+    for ref in ("refs/heads/main", "refs/remotes/origin/main"):
+        git_test_command(cloned_repo_path, "update-ref", ref, previous_commit)  # Move the refs.
+
+    RepositoryUpdater(cloned_repo_path).restore_refs()  # Restore with a fresh updater.
+    assert git_test_command(cloned_repo_path, "rev-parse", "refs/heads/main") == original_main
+    assert git_test_command(cloned_repo_path, "rev-parse", "refs/remotes/origin/main") == original_main
+    assert git_test_command(cloned_repo_path, "symbolic-ref", "refs/remotes/origin/HEAD") == "refs/remotes/origin/main"
+
+
+class StreamingClient:
+    """Fake LLM client that streams a canned response in small pieces."""
+
+    def __init__(self, response):
+        self.response = response
+
+    async def async_stream_text(self, system_prompt, prompt, **kwargs):
+        for start in range(0, len(self.response), 7):
+            yield self.response[start:start + 7]
+
+
+def test_stream_commit_json_ignores_nested_keys():
+    """Test that a required key inside a nested object is not taken for the top-level field."""
+    response = json.dumps(
+        {
+            "code_changes": {"new_commit_title": "WRONG", "files_changed": ["main.py"]},
+            "short_analysis": "Analysis with {braces} and \"quotes\"",
+            "new_commit_title": "fix: right title",
+            "new_detailed_commit_message": "Details",
+        }
+    )
+    generated = asyncio.run(_stream_commit_json(StreamingClient(response), "system", "prompt"))
+    assert generated == {
+        "short_analysis": "Analysis with {braces} and \"quotes\"",
+        "new_commit_title": "fix: right title",
+        "new_detailed_commit_message": "Details",
+    }
+
+
+@pytest.mark.parametrize(
+    "use_filter_repo",
+    [
+        False,
+        pytest.param(
+            True, marks=pytest.mark.skipif(shutil.which("git-filter-repo") is None, reason="git filter-repo missing")
+        ),
+    ],
+)
+@pytest.mark.parametrize("detached", [False, True])
+def test_repository_updater_rewrite(cloned_repo_path, monkeypatch, use_filter_repo, detached):
+    """Test rewriting messages that hold quotes, backslashes and newlines, with either rewrite tool."""
+    if not use_filter_repo:
+        monkeypatch.setattr("main.shutil.which", lambda name: None)  # Force the filter-branch fallback.
+    if detached:
+        git_test_command(cloned_repo_path, "checkout", "-q", "--detach")
+    history = CommitHistory()
+    history.commits = GitAnalyzer(cloned_repo_path).get_commits()  # Newest commit first.
+    new_messages = [
+        'fix: handle "quoted" and \'single quoted\' text\n\n- Keeps C:\\path\\n and \\\\ as written',
+        "feat: first commit\n\nLine one\nLine two",
+    ]
+    for commit, new_message in zip(history.commits, new_messages):
+        commit.new_message = new_message
+
+    RepositoryUpdater(cloned_repo_path).rewrite_commit_messages(history)  # Rewrite the messages.
+    log = git_test_command(cloned_repo_path, "log", "--format=%B%x00", "HEAD")
+    assert [message.strip() for message in log.split("\0") if message.strip()] == new_messages
+
+
+def test_run_git_command_stream_reports_failure(tmp_path):
+    """Test that a failing streamed git command raises with git's error message."""
+    with pytest.raises(RuntimeError, match="not a git repository"):
+        list(run_git_command_stream(["log"], str(tmp_path)))  # tmp_path is not a repository.
+
+
+def test_run_git_command_stream_survives_noisy_stderr(tmp_path):
+    """Test that much more stderr output than a pipe buffer holds doesn't block the stream."""
+    noisy_alias = "alias.noisy=!yes 'warning: inexact rename detection was skipped' | head -c 500000 >&2; echo done"
+    lines = []
+    reader = threading.Thread(
+        target=lambda: lines.extend(run_git_command_stream(["-c", noisy_alias, "noisy"], str(tmp_path))),
+        daemon=True,  # A hung reader must not keep the test run alive.
+    )
+    reader.start()
+    reader.join(timeout=30)
+    assert not reader.is_alive()  # The stream finished instead of hanging.
+    assert lines == [b"done\n"]
+
+
+def test_generate_commit_message_parts_keeps_code_changes():
+    """Test that the per-chunk messages of a large diff keep code_changes for combine_messages."""
+    response = json.dumps(
+        {
+            "short_analysis": "Mocked analysis",
+            "new_commit_title": "feat: part",
+            "new_detailed_commit_message": "Details",
+            "code_changes": {"files_changed": ["a.py"]},
+        }
+    )
+    diff = "".join(f"diff --git a/{name} b/{name}\n+{'x' * 80}\n" for name in ("a.py", "b.py"))
+    parts = asyncio.run(_generate_commit_message_parts(diff, "old message", StreamingClient(response), "model", 120))
+    assert len(parts) == 2  # One message per file chunk.
+    assert all(part["code_changes"] == {"files_changed": ["a.py"]} for part in parts)
+
+
+@pytest.mark.parametrize("git_version", [(2, 30), (2, 31)])
+def test_iter_filtered_diffs_merge_on_any_git(tmp_path, monkeypatch, git_version):
+    """Test that a merge gets its first-parent diff with and without 'git log --diff-merges'."""
+    git_test_command(tmp_path, "init", "-q", "-b", "main")
+    if git_version >= (2, 31) and GitAnalyzer(str(tmp_path)).get_git_version() < (2, 31):
+        pytest.skip("The installed git has no --diff-merges")
+    for branch, name in (("main", "base.py"), ("side", "side.py"), ("main", "main.py")):
+        if branch == "side":
+            git_test_command(tmp_path, "checkout", "-q", "-b", "side")
+        elif name == "main.py":
+            git_test_command(tmp_path, "checkout", "-q", "main")
+        (tmp_path / name).write_text(f"{name}\n")
+        git_test_command(tmp_path, "add", name)
+        git_test_command(tmp_path, "commit", "-q", "-m", f"Add {name}")
+    git_test_command(tmp_path, "merge", "-q", "--no-ff", "side", "-m", "Merge side")
+    monkeypatch.setattr(GitAnalyzer, "get_git_version", lambda self: git_version)
+
+    analyzer = GitAnalyzer(str(tmp_path))
+    commits = analyzer.get_commits()
+    filtered_diffs = {commit.hash: filtered_diff for commit, filtered_diff in iter_filtered_diffs(analyzer, commits)}
+    assert set(filtered_diffs) == {commit.hash for commit in commits}  # Every commit appears once.
+    merge_hash = commits[0].hash
+    assert filtered_diffs[merge_hash] == git_test_command(tmp_path, "diff", f"{merge_hash}~1", merge_hash)
+
+
+@pytest.mark.parametrize(
+    "use_filter_repo",
+    [
+        False,
+        pytest.param(
+            True, marks=pytest.mark.skipif(shutil.which("git-filter-repo") is None, reason="git filter-repo missing")
+        ),
+    ],
+)
+def test_repository_updater_rewrite_refuses_dirty_tree(cloned_repo_path, monkeypatch, use_filter_repo):
+    """Test that uncommitted edits to tracked files stop the rewrite instead of being discarded."""
+    if not use_filter_repo:
+        monkeypatch.setattr("main.shutil.which", lambda name: None)  # Force the filter-branch fallback.
+    tracked_file = os.path.join(cloned_repo_path, "tracked.txt")
+    with open(tracked_file, "w") as file:
+        file.write("committed\n")
+    git_test_command(cloned_repo_path, "add", "tracked.txt")
+    git_test_command(cloned_repo_path, "commit", "-q", "-m", "Add tracked file")
+    with open(tracked_file, "a") as file:
+        file.write("uncommitted edit\n")  # Modify the tracked file without committing.
+
+    history = CommitHistory()
+    history.commits = GitAnalyzer(cloned_repo_path).get_commits()
+    history.commits[0].new_message = "feat: new message"
+    with pytest.raises(RuntimeError, match="uncommitted changes"):
+        RepositoryUpdater(cloned_repo_path).rewrite_commit_messages(history)
+
+    with open(tracked_file) as file:
+        assert file.read() == "committed\nuncommitted edit\n"  # The edit survives.
+    assert git_test_command(cloned_repo_path, "log", "-1", "--format=%s") == "Add tracked file"  # Not rewritten.
+
+
 # Parameterized test: This test will run multiple times with different client types.
 @pytest.mark.parametrize(
     "client_type, expected_class",